@@ -4,6 +4,7 @@ from .requestcontext import RequestContext, Request
 from .utils import *
 from .methods import *
 from .decorators import *
+from .middlewares import *
 
 
 Sherry = Engine
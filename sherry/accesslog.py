@@ -0,0 +1,225 @@
+"""
+access log, written in batches by a background thread
+"""
+
+import atexit
+import collections
+import json
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from typing import IO, TYPE_CHECKING, Deque, Optional, Union
+
+if TYPE_CHECKING:
+    from .requestcontext import RequestContext
+    from .response import Response
+
+COMMON = "common"
+JSON = "json"
+
+
+# like apache: control and non-ascii characters as \xhh, `"` and `\` backslashed
+_ESCAPES = {c: f"\\x{c:02x}" for c in [*range(0x20), *range(0x7F, 0x100)]}
+_ESCAPES[ord('"')] = '\\"'
+_ESCAPES[ord("\\")] = "\\\\"
+
+
+def escape(s: str) -> str:
+    """
+    escape a request field, so it cannot break or forge a log line
+    """
+    return s.translate(_ESCAPES)
+
+
+def format_common(record: tuple) -> str:
+    """
+    common log format, `host - - [time] "request" status bytes`
+    """
+    ts, addr, method, path, query, protocol, _, status, size, _ = record
+    when = time.strftime("%d/%b/%Y:%H:%M:%S %z", time.localtime(ts))
+    target = path + "?" + query if query else path
+    request = escape(f"{method} {target} {protocol}")
+    return f'{escape(addr)} - - [{when}] "{request}" {status} {size or "-"}'
+
+
+def format_json(record: tuple) -> str:
+    """
+    one json object per line
+    """
+    ts, addr, method, path, query, protocol, pattern, status, size, duration = record
+    return json.dumps(
+        {
+            "time": ts,
+            "remote_addr": addr,
+            "method": method,
+            "path": path,
+            "query": query,
+            "protocol": protocol,
+            "pattern": pattern,
+            "status": status,
+            "bytes": size,
+            "duration_ms": round(duration * 1000, 3),
+        }
+    )
+
+
+formatters = {COMMON: format_common, JSON: format_json}
+
+
+class AccessLog:
+    """
+    record requests on the serving thread without blocking it
+
+    records are appended to a bounded queue and formatted and written
+    by a background thread every `flush_interval` seconds or `batch_size` records,
+    records arriving while the queue is full are counted in `dropped`
+    """
+
+    dropped: int
+    sample: float
+    queue_size: int
+    batch_size: int
+    flush_interval: float
+
+    def __init__(
+        self,
+        target: Union[str, IO[str], None] = None,
+        fmt=COMMON,
+        sample: float = 1.0,
+        queue_size=8192,
+        batch_size=256,
+        flush_interval: float = 0.5,
+    ):
+        """
+        :param target: file path (appended) or text stream, stderr by default
+        :param fmt: "common" or "json"
+        :param sample: fraction of requests recorded (0 - 1)
+        """
+        if fmt not in formatters:
+            raise ValueError(f"unknown access log format: {fmt}")
+        self.target = sys.stderr if target is None else target
+        self.format = formatters[fmt]
+        self.sample = sample
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: Deque[tuple] = collections.deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        if isinstance(self.target, str):
+            self._stream = open(self.target, "a", encoding="utf-8")
+        else:
+            self._stream = self.target
+        self._closed = False
+        # fork hooks cannot be unregistered, do not keep a closed log alive
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: _after_fork(ref))
+        atexit.register(self.close)
+
+    def record(
+        self,
+        ctx: "RequestContext",
+        response: "Response",
+        duration: float,
+        head=False,
+    ):
+        """
+        queue a request, called by Engine.serve_http
+
+        :param head: the body is not sent (HEAD request), logged as 0 bytes
+        """
+        if self.sample < 1 and random.random() >= self.sample:
+            return
+        queue = self._queue
+        if len(queue) >= self.queue_size:
+            with self._lock:
+                self.dropped += 1
+            return
+        if self._thread is None:
+            self.start()
+        body = None if head else response.response
+        if isinstance(body, str):
+            body = body.encode(response.charset)
+        queue.append(
+            (
+                time.time(),
+                ctx.remote_addr(),
+                ctx.method(),
+                ctx.path(),
+                ctx.query_string(),
+                ctx.protocol(),
+                ctx.pattern,
+                response._status,
+                len(body) if body else 0,
+                duration,
+            )
+        )
+        if len(queue) >= self.batch_size and not self._wake.is_set():
+            self._wake.set()
+
+    def start(self):
+        """
+        start the writer thread (done on the first record)
+        """
+        with self._lock:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="sherry-access-log", daemon=True
+            )
+            self._thread.start()
+
+    def close(self):
+        """
+        write queued records and stop the writer thread
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        atexit.unregister(self.close)
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+        self._write()
+        if self._stream is not self.target:
+            self._stream.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._write()
+
+    def _write(self):
+        queue = self._queue
+        while queue:
+            lines = []
+            for _ in range(min(len(queue), self.batch_size)):
+                lines.append(self.format(queue.popleft()))
+                lines.append("\n")
+            try:
+                self._stream.write("".join(lines))
+                self._stream.flush()
+            except (OSError, ValueError):
+                with self._lock:
+                    self.dropped += len(lines) // 2
+
+    def _after_fork(self):
+        # the writer thread does not survive fork, the child starts its own
+        self._queue.clear()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+
+def _after_fork(ref: "weakref.ref[AccessLog]"):
+    log = ref()
+    if log is not None:
+        log._after_fork()
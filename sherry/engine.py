@@ -1,11 +1,17 @@
-from typing import List, Tuple
-from wsgiref.simple_server import make_server
+import time
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
 
 from . import methods
 from . import response
+from . import server
+from .accesslog import AccessLog
+from .middlewares import cors
 from .requestcontext import RequestContext, HandlerFunc
 from .router import Router
 
+if TYPE_CHECKING:
+    from .sharedcache import SharedCache
+
 
 class RouterGroup:
     engine: "Engine"
@@ -96,11 +102,17 @@ class Engine(RouterGroup):
     router_group: "RouterGroup"
     router: "Router"
     prefix: str
-    middlewares = []
+    middlewares: Tuple["HandlerFunc"]
     groups: List["RouterGroup"]
     engine: "Engine"
     no_route_handler: List["HandlerFunc"]
     no_method_handler: List["HandlerFunc"]
+    startup_handlers: List[Callable[[], None]]
+    shutdown_handlers: List[Callable[[], None]]
+    access_log: Optional["AccessLog"]
+    shared_cache: Optional["SharedCache"]
+    cors_origin: Optional[str]
+    cors_max_age: int
 
     def __init__(self, re=False, base=""):
         self.router_group = RouterGroup(engine=self)
@@ -108,7 +120,14 @@ class Engine(RouterGroup):
         self.no_method_handler = [response.error_method_not_allow]
         self.no_route_handler = [response.error_not_found]
         self.prefix = "" if base == "/" else base
+        self.middlewares = ()
         self.groups = []
+        self.startup_handlers = []
+        self.shutdown_handlers = []
+        self.access_log = None
+        self.shared_cache = None
+        self.cors_origin = None
+        self.cors_max_age = 0
         self.router = Router()
         if re:
             self.use_regex()
@@ -116,24 +135,115 @@ class Engine(RouterGroup):
     def use_regex(self):
         self.router.re = True
 
+    def use_cors(self, origin="*", max_age=600):
+        """
+        allow cross-origin requests from origin
+
+        preflight requests are answered from the router's method index,
+        other responses get Access-Control-Allow-Origin
+        """
+        self.cors_origin = origin
+        self.cors_max_age = max_age
+        self.use(cors(origin))
+
+    def use_access_log(self, target=None, fmt="common", **options) -> "AccessLog":
+        """
+        log every request (method, path, pattern, status, bytes, duration)
+        from a background writer, see AccessLog for options
+
+        :param target: file path or text stream, stderr by default
+        :param fmt: "common" or "json"
+        """
+        if self.access_log is not None:
+            self.access_log.close()
+        else:
+            self.on_shutdown(lambda: self.access_log.close())
+        self.access_log = AccessLog(target, fmt, **options)
+        return self.access_log
+
+    def use_shared_cache(self, **options) -> "SharedCache":
+        """
+        create engine.shared_cache, shared by all worker processes,
+        call before run, see SharedCache for options
+        """
+        from .sharedcache import SharedCache
+
+        self.shared_cache = SharedCache(**options)
+        return self.shared_cache
+
+    def on_startup(self, *handlers: Callable[[], None]):
+        """
+        add functions called (without arguments) before serving,
+        once in each worker process
+        """
+        self.startup_handlers.extend(handlers)
+
+    def on_shutdown(self, *handlers: Callable[[], None]):
+        """
+        add functions called (without arguments) after serving stops,
+        once in each worker process
+        """
+        self.shutdown_handlers.extend(handlers)
+
+    def startup(self):
+        for func in self.startup_handlers:
+            func()
+
+    def shutdown(self):
+        for func in reversed(self.shutdown_handlers):
+            func()
+
     def run(
         self,
         port: int,
         addr="localhost",
         fmt="Running on http://{addr}:{port}",
         poll_interval: float = 0.5,
+        workers=0,
+        max_requests=0,
+        max_requests_jitter=0,
+        max_rss=0,
+        drain_timeout: float = 30,
     ):
         """
         start a http server
+
+        SIGTERM / SIGINT stop after in-flight requests finish
+
+        :param workers: number of forked worker processes, 0 serves in this process
+        :param max_requests: recycle a worker after this many requests (0 never)
+        :param max_requests_jitter: add random 0 - jitter to max_requests per worker
+        :param max_rss: recycle a worker above this resident size in bytes (0 never)
+        :param drain_timeout: seconds a stopping worker may finish before being killed
+
+        max_requests, max_requests_jitter, max_rss and drain_timeout apply
+        to forked workers only, the recycling options raise ValueError without workers;
+        with workers, SIGHUP starts new workers before draining the old ones
         """
-        httpd = make_server(addr, port, self.serve_http)
+        if not workers and (max_requests or max_requests_jitter or max_rss):
+            raise ValueError(
+                "max_requests, max_requests_jitter and max_rss require workers"
+            )
         print(fmt.format(addr=addr, port=port))
-        httpd.serve_forever(poll_interval=poll_interval)
+        server.serve(
+            self,
+            addr,
+            port,
+            poll_interval=poll_interval,
+            workers=workers,
+            max_requests=max_requests,
+            max_requests_jitter=max_requests_jitter,
+            max_rss=max_rss,
+            drain_timeout=drain_timeout,
+        )
 
     def serve_http(self, env, start_response):
         """
         serve http request
         """
+        access_log = self.access_log
+        if access_log is not None:
+            begin = time.perf_counter()
         middlewares = self.middlewares
         ctx = RequestContext(env, self.engine)
         path = ctx.path()
@@ -150,4 +260,7 @@ class Engine(RouterGroup):
         else:
             handle_response = self.router.handle(ctx)
 
-        return handle_response.start_response(start_response)
+        head = ctx.method() == methods.HEAD
+        if access_log is not None:
+            access_log.record(ctx, handle_response, time.perf_counter() - begin, head)
+        return handle_response.start_response(start_response, head=head)
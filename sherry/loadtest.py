@@ -0,0 +1,341 @@
+"""
+in-process load generator
+
+```sh
+python -m sherry.loadtest app:engine -p / -p /users/1 -c 8 -n 10000
+python -m sherry.loadtest app:engine --http -c 32 -d 10
+```
+"""
+
+import argparse
+import http.client
+import importlib
+import io
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+from wsgiref.util import setup_testing_defaults
+
+from . import methods
+
+
+class Histogram:
+    """
+    log-linear latency histogram (microseconds)
+
+    values below 2 ** (SUB_BITS + 1) are exact,
+    larger values keep SUB_BITS significant bits (about 3% error)
+    """
+
+    SUB_BITS = 5
+
+    counts: Dict[int, int]
+    total: int
+    max: int
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def index_of(cls, value: int) -> int:
+        shift = value.bit_length() - cls.SUB_BITS - 1
+        if shift <= 0:
+            return value
+        return ((shift + 1) << cls.SUB_BITS) + (value >> shift) - (1 << cls.SUB_BITS)
+
+    @classmethod
+    def value_of(cls, index: int) -> int:
+        if index < 1 << (cls.SUB_BITS + 1):
+            return index
+        shift = (index >> cls.SUB_BITS) - 1
+        top = (index & ((1 << cls.SUB_BITS) - 1)) + (1 << cls.SUB_BITS)
+        return (top << shift) + (1 << shift >> 1)
+
+    def record(self, value: int):
+        index = self.index_of(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> int:
+        """
+        get the value at percentile p (0 - 100)
+        """
+        if not self.total:
+            return 0
+        rank = max(1, round(self.total * p / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.value_of(index), self.max)
+        return self.max
+
+
+class Report:
+    histograms: Dict[str, Histogram]
+    errors: Dict[str, int]
+    elapsed: float
+
+    def __init__(self):
+        self.histograms = {}
+        self.errors = {}
+        self.elapsed = 0.0
+
+    def merge(self, histograms: Dict[str, Histogram], errors: Dict[str, int]):
+        for pattern, histogram in histograms.items():
+            self.histograms.setdefault(pattern, Histogram()).merge(histogram)
+        for pattern, count in errors.items():
+            self.errors[pattern] = self.errors.get(pattern, 0) + count
+
+    def format(self) -> str:
+        out = io.StringIO()
+        percentiles = (50, 90, 99, 99.9)
+        header = ("pattern", "requests", "errors", "req/s") + tuple(
+            f"p{p:g}" for p in percentiles
+        )
+        rows = []
+        total = Histogram()
+        for pattern, histogram in sorted(self.histograms.items()):
+            total.merge(histogram)
+            rows.append(self._row(pattern, histogram, self.errors.get(pattern, 0)))
+        if len(rows) > 1:
+            rows.append(self._row("(total)", total, sum(self.errors.values())))
+        widths = [max(len(str(row[i])) for row in rows + [header]) for i in range(len(header))]
+        for row in [header] + rows:
+            out.write("  ".join(str(v).rjust(w) for v, w in zip(row, widths)).rstrip())
+            out.write("\n")
+        return out.getvalue()
+
+    def _row(self, pattern: str, histogram: Histogram, errors: int) -> tuple:
+        rps = histogram.total / self.elapsed if self.elapsed else 0.0
+        return (pattern, histogram.total, errors, f"{rps:.0f}") + tuple(
+            format_us(histogram.percentile(p)) for p in (50, 90, 99, 99.9)
+        )
+
+
+def format_us(us: int) -> str:
+    if us < 1000:
+        return f"{us}us"
+    if us < 1000000:
+        return f"{us / 1000:.2f}ms"
+    return f"{us / 1000000:.2f}s"
+
+
+def pattern_of(engine, path: str) -> str:
+    """
+    get the route pattern a path resolves to (path itself if none)
+    """
+    if not engine.router.re:
+        node, _ = engine.router.get_route(path)
+        if node is not None:
+            return node.pattern
+    return path
+
+
+def load_engine(target: str):
+    """
+    load "module:attribute"
+    """
+    module_name, _, attr = target.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attr or "app")
+
+
+def _split_target(path: str) -> Tuple[str, str]:
+    path, _, query = path.partition("?")
+    return path, query
+
+
+def _run_workers(worker, concurrency: int, requests: int, duration: float) -> Report:
+    report = Report()
+    lock = threading.Lock()
+    remaining = [requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def take() -> bool:
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def run():
+        histograms, errors = worker(take)
+        with lock:
+            report.merge(histograms, errors)
+
+    threads = [threading.Thread(target=run) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def run_wsgi(
+    engine,
+    paths: List[str],
+    method=methods.GET,
+    concurrency=1,
+    requests=10000,
+    duration: float = 0,
+) -> Report:
+    """
+    drive engine.serve_http directly with synthetic environs,
+    measures framework overhead without any socket io
+    """
+    targets = []
+    for path in paths:
+        path_info, query = _split_target(path)
+        environ = {}
+        setup_testing_defaults(environ)
+        environ["REQUEST_METHOD"] = method
+        environ["PATH_INFO"] = path_info
+        environ["QUERY_STRING"] = query
+        environ["CONTENT_TYPE"] = ""
+        environ["CONTENT_LENGTH"] = ""
+        targets.append((pattern_of(engine, path_info), environ))
+
+    statuses = threading.local()
+
+    def start_response(status, headers, exc_info=None):
+        statuses.value = status
+
+    def worker(take):
+        histograms = {pattern: Histogram() for pattern, _ in targets}
+        errors = {}
+        i = 0
+        while take():
+            pattern, environ = targets[i % len(targets)]
+            i += 1
+            begin = time.perf_counter_ns()
+            try:
+                for _ in engine.serve_http(dict(environ), start_response):
+                    pass
+                failed = statuses.value[0] == "5"
+            except Exception:
+                failed = True
+            histograms[pattern].record((time.perf_counter_ns() - begin) // 1000)
+            if failed:
+                errors[pattern] = errors.get(pattern, 0) + 1
+        return histograms, errors
+
+    return _run_workers(worker, concurrency, requests, duration)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def run_http(
+    engine,
+    paths: List[str],
+    method=methods.GET,
+    concurrency=1,
+    requests=10000,
+    duration: float = 0,
+    addr="127.0.0.1",
+    port=0,
+) -> Report:
+    """
+    start engine on loopback (wsgiref, single-threaded), drive it from
+    `concurrency` client threads
+
+    every request opens a new connection and the server accepts them
+    one at a time, so latencies include connect time and queueing
+    behind other clients, requests are effectively serialized
+    """
+    httpd = make_server(addr, port, engine.serve_http, handler_class=_QuietHandler)
+    port = httpd.server_port
+    server = threading.Thread(target=httpd.serve_forever, daemon=True)
+    server.start()
+    targets = [(pattern_of(engine, _split_target(path)[0]), path) for path in paths]
+
+    def worker(take):
+        histograms = {pattern: Histogram() for pattern, _ in targets}
+        errors = {}
+        i = 0
+        while take():
+            pattern, path = targets[i % len(targets)]
+            i += 1
+            begin = time.perf_counter_ns()
+            conn = http.client.HTTPConnection(addr, port)
+            try:
+                conn.request(method, path)
+                res = conn.getresponse()
+                res.read()
+                failed = res.status >= 500
+            except (OSError, http.client.HTTPException):
+                failed = True
+            finally:
+                conn.close()
+            histograms[pattern].record((time.perf_counter_ns() - begin) // 1000)
+            if failed:
+                errors[pattern] = errors.get(pattern, 0) + 1
+        return histograms, errors
+
+    try:
+        return _run_workers(worker, concurrency, requests, duration)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sherry.loadtest", description="load test a sherry engine"
+    )
+    parser.add_argument("target", help='engine to load, "module:attribute"')
+    parser.add_argument(
+        "-p", "--path", action="append", help="request path, repeatable (default /)"
+    )
+    parser.add_argument("-m", "--method", default=methods.GET)
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("-n", "--requests", type=int, default=10000)
+    parser.add_argument(
+        "-d", "--duration", type=float, default=0, help="seconds, overrides -n"
+    )
+    parser.add_argument(
+        "--http", action="store_true", help="serve on loopback (single-threaded, connection per request)"
+    )
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, "")
+    engine = load_engine(args.target)
+    paths = args.path or ["/"]
+    options = dict(
+        method=args.method.upper(),
+        concurrency=args.concurrency,
+        requests=args.requests,
+        duration=args.duration,
+    )
+    if args.http:
+        report = run_http(engine, paths, port=args.port, **options)
+    else:
+        report = run_wsgi(engine, paths, **options)
+
+    mode = "http" if args.http else "wsgi"
+    print(f"{mode}: {report.elapsed:.2f}s, concurrency {args.concurrency}")
+    print(report.format(), end="")
+
+
+if __name__ == "__main__":
+    main()
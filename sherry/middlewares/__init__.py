@@ -0,0 +1,2 @@
+from .coalesce import *
+from .cors import *
@@ -0,0 +1,108 @@
+import copy
+import threading
+from typing import Dict, Iterable, Optional
+from wsgiref.headers import Headers
+
+from .. import methods
+from ..requestcontext import RequestContext
+from ..response import Response, response_status_text
+
+
+def _copy(response: Response) -> Response:
+    # own headers, shared body bytes
+    copied = copy.copy(response)
+    copied.headers = Headers(response.headers.items())
+    return copied
+
+
+def _error(error: BaseException) -> BaseException:
+    # a fresh exception per duplicate, raising the shared one from
+    # several threads would rewrite its __traceback__
+    try:
+        return copy.copy(error)
+    except Exception:
+        return RuntimeError(f"coalesced request failed: {error!r}")
+
+
+class _Call:
+    event: threading.Event
+    response: Optional[Response]
+    error: Optional[BaseException]
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+def coalesce(
+    query: Iterable[str] = (),
+    headers: Iterable[str] = (),
+    timeout: Optional[float] = None,
+):
+    """
+    coalesce identical concurrent requests (single-flight)
+
+    the first request for a key runs the rest of the handler chain,
+    concurrent duplicates wait for it and receive a copy of its response
+    (own headers, same body);
+    if the first request raises, the duplicates raise a copy of its error
+
+    the key is method + path + the selected query arguments and headers,
+    only GET and HEAD are coalesced (the body is not part of the key),
+    other methods pass through
+
+    example
+    ```py
+    app.get("/report", coalesce(query=["id"], timeout=5), report_handler)
+    ```
+
+    :param query: query arguments that distinguish requests
+    :param headers: request headers that distinguish requests
+    :param timeout: seconds a duplicate waits before responding 504
+    """
+    query = tuple(query)
+    headers = tuple(headers)
+    lock = threading.Lock()
+    calls: Dict[tuple, _Call] = {}
+
+    def coalesce_handler(ctx: RequestContext) -> Response:
+        method = ctx.method()
+        if method != methods.GET and method != methods.HEAD:
+            return ctx.next()
+
+        key = (method, ctx.path())
+        if query:
+            arguments = ctx.query
+            key += tuple(arguments.get(name) for name in query)
+        if headers:
+            key += tuple(ctx.header(name) for name in headers)
+
+        with lock:
+            call = calls.get(key)
+            leader = call is None
+            if leader:
+                call = calls[key] = _Call()
+
+        if not leader:
+            ctx.abort()
+            if not call.event.wait(timeout):
+                return response_status_text(504)
+            if call.error is not None:
+                raise _error(call.error) from call.error
+            return _copy(call.response)
+
+        try:
+            response = ctx.next()
+            # snapshot before earlier middlewares modify the leader's response
+            call.response = _copy(response)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with lock:
+                del calls[key]
+            call.event.set()
+        return response
+
+    return coalesce_handler
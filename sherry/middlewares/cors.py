@@ -0,0 +1,20 @@
+from ..requestcontext import RequestContext
+from ..response import Response
+
+
+def cors(origin="*"):
+    """
+    add Access-Control-Allow-Origin to responses of cross-origin requests
+
+    preflight requests are answered by the router, see Engine.use_cors
+    """
+
+    def cors_handler(ctx: RequestContext) -> Response:
+        response = ctx.next()
+        if ctx.header("Origin"):
+            response.headers.setdefault("Access-Control-Allow-Origin", origin)
+            if origin != "*":
+                response.headers.setdefault("Vary", "Origin")
+        return response
+
+    return cors_handler
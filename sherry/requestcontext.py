@@ -21,12 +21,15 @@ class RequestContext:
     response: Response
     engine: "Engine"
     params: Optional[dict]
+    pattern: Optional[str]
 
     def __init__(self, environ, engine=None):
         self.engine = engine
         self._environ = environ
         self._index = -1
         self.handlers = []
+        self.params = None
+        self.pattern = None
 
     def next(self) -> Response:
         """
@@ -67,6 +70,18 @@ class RequestContext:
         """
         return self._environ["REQUEST_METHOD"]
 
+    def remote_addr(self) -> str:
+        """
+        get client address
+        """
+        return self._environ.get("REMOTE_ADDR", "-")
+
+    def protocol(self) -> str:
+        """
+        get http protocol version
+        """
+        return self._environ.get("SERVER_PROTOCOL", "HTTP/1.0")
+
     def server_port(self) -> str:
         """
         get port
@@ -83,7 +98,7 @@ class RequestContext:
         """
         get query string
         """
-        return self._environ["QUERY_STRING"]
+        return self._environ.get("QUERY_STRING", "")
 
     def content_length(self):
         """
@@ -103,12 +118,21 @@ class RequestContext:
         """
         return self._environ["HTTP_ACCEPT"]
 
+    def header(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        get a request header by name
+        """
+        key = key.upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        return self._environ.get(key, default)
+
     @property
     def query(self):
         """
         get query arguments
         """
-        get_arguments = urllib.parse.parse_qs(self._environ["QUERY_STRING"])
+        get_arguments = urllib.parse.parse_qs(self.query_string())
         return {k: v[0] for k, v in get_arguments.items()}
 
 
@@ -65,15 +65,19 @@ class Response:
         """
         self.set_header("content-length", length)
 
-    def start_response(self, start_response):
-        start_response(
-            f"{self._status} {http_status_text(self._status)}", self.headers.items()
-        )
-        if self.response:
-            if isinstance(self.response, bytes):
-                yield self.response
-            else:
-                yield self.response.encode(self.charset)
+    def start_response(self, start_response, head=False):
+        """
+        :param head: send headers only (HEAD request), with the body's Content-Length
+        """
+        headers = self.headers.items()
+        body = self.response
+        if body and not isinstance(body, bytes):
+            body = body.encode(self.charset)
+        if head and body and "content-length" not in self.headers:
+            headers.append(("Content-Length", str(len(body))))
+        start_response(f"{self._status} {http_status_text(self._status)}", headers)
+        if body and not head:
+            yield body
 
 
 def error_not_found() -> Response:
@@ -2,6 +2,7 @@ import re
 from types import FunctionType
 from typing import Dict, List, Optional
 
+from . import methods
 from .node import Node, wild_of
 from .requestcontext import RequestContext
 from .response import Response
@@ -31,14 +32,30 @@ def split_slash(s: str) -> List[str]:
     return parts
 
 
+def allow_header(handlers_map: Dict[str, List[FunctionType]]) -> str:
+    """
+    value of the Allow header for a pattern's methods,
+    HEAD is implied by GET, OPTIONS is always answered
+    """
+    allowed = set(handlers_map)
+    if methods.GET in allowed:
+        allowed.add(methods.HEAD)
+    allowed.add(methods.OPTIONS)
+    ordered = [method for method in methods.ALL if method in allowed]
+    ordered += sorted(allowed.difference(methods.ALL))
+    return ", ".join(ordered)
+
+
 class Router:
     root: Node
     handlers: Dict[str, Dict[str, List[FunctionType]]]
+    allowed: Dict[str, str]
     re: bool
 
     def __init__(self):
         self.root = Node()
         self.handlers = {}
+        self.allowed = {}
         self.re = False
 
     def add_route(self, method: str, pattern: str, *handler_func: FunctionType):
@@ -48,12 +65,15 @@ class Router:
         method will be upper
 
         expand handler functions to handlers[pattern][method.upper()]
+
+        update allowed[pattern], the Allow header of pattern
         """
         if not self.re:
             self.root.set(pattern)
         if pattern not in self.handlers:
             self.handlers[pattern] = {}
         self.handlers[pattern][method.upper()] = list(handler_func)
+        self.allowed[pattern] = allow_header(self.handlers[pattern])
 
     def get_route(self, path: str) -> tuple[Optional["Node"], Optional[dict]]:
         """
@@ -95,23 +115,68 @@ class Router:
         ctx.params = params
         if node is not None:
             # has router
-            pattern = node.pattern
-            method = ctx.method()
-
-            h_p = self.handlers.get(pattern)
-            h_p_m = h_p.get(method)
-            if h_p_m:
-                # has method
-                ctx.handlers.extend(h_p_m)
-            else:
-                # no method
-                ctx.handlers.extend(ctx.engine.no_method_handler)
-        else:
-            # no route
-            ctx.handlers.extend(ctx.engine.no_route_handler)
+            return self.dispatch(ctx, node.pattern)
 
+        # no route
+        ctx.handlers.extend(ctx.engine.no_route_handler)
         return ctx.next()
 
+    def dispatch(self, ctx: RequestContext, pattern: str) -> Response:
+        """
+        handle a request matching pattern
+
+        HEAD without its own handlers runs the GET handlers,
+        OPTIONS without its own handlers is answered from allowed[pattern]
+        without running any handler,
+        no method handles engine.no_method_handler, with the Allow header
+
+        :param ctx: request context
+        :param pattern: matched pattern
+        :return: response handler's response
+        """
+        ctx.pattern = pattern
+        method = ctx.method()
+        handlers_map = self.handlers[pattern]
+        handlers = handlers_map.get(method)
+        if not handlers:
+            if method == methods.HEAD:
+                handlers = handlers_map.get(methods.GET)
+            elif method == methods.OPTIONS:
+                return self.options(ctx, pattern)
+
+        if handlers:
+            # has method
+            ctx.handlers.extend(handlers)
+            return ctx.next()
+
+        # no method
+        ctx.handlers.extend(ctx.engine.no_method_handler)
+        response = ctx.next()
+        response.headers.setdefault("Allow", self.allowed[pattern])
+        return response
+
+    def options(self, ctx: RequestContext, pattern: str) -> Response:
+        """
+        answer OPTIONS and CORS preflight requests of pattern
+        """
+        allow = self.allowed[pattern]
+        response = Response(status=204)
+        response.set_header("Allow", allow)
+        origin = ctx.engine.cors_origin
+        if origin and ctx.header("Access-Control-Request-Method"):
+            response.set_header("Access-Control-Allow-Origin", origin)
+            if origin != "*":
+                response.set_header("Vary", "Origin")
+            response.set_header("Access-Control-Allow-Methods", allow)
+            request_headers = ctx.header("Access-Control-Request-Headers")
+            if request_headers:
+                response.set_header("Access-Control-Allow-Headers", request_headers)
+            if ctx.engine.cors_max_age:
+                response.set_header(
+                    "Access-Control-Max-Age", str(ctx.engine.cors_max_age)
+                )
+        return response
+
     def handle_prefix(self, ctx: RequestContext, prefix: str) -> Response:
         """
         handle a request
@@ -125,19 +190,11 @@ class Router:
         :return: response handler's response
         """
         path = ctx.path()
-        method = ctx.method()
         for regex in self.handlers:
             if len(regex) < len(prefix) or len(regex[: len(prefix)]) < len(prefix):
                 continue
             if re.match(regex[len(regex):], path[len(regex):]):
-                key = prefix + regex
-                handlers_map = self.handlers.get(key)
-                handlers = handlers_map.get(method)
-                if handlers is None:
-                    ctx.handlers.extend(ctx.engine.no_method_handler)
-                else:
-                    ctx.handlers.extend(handlers)
-                return ctx.next()
+                return self.dispatch(ctx, prefix + regex)
 
         ctx.handlers.extend(ctx.engine.no_route_handler)
         return ctx.next()
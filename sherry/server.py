@@ -0,0 +1,336 @@
+"""
+serving loop, pre-forked workers and their lifecycle
+"""
+
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import traceback
+from typing import TYPE_CHECKING, Dict, Optional
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+if TYPE_CHECKING:
+    from .engine import Engine
+
+
+def current_rss() -> int:
+    """
+    get resident set size of this process in bytes
+
+    current size from /proc where available, otherwise (macOS, BSD)
+    the peak size from getrusage
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class CountingServer(WSGIServer):
+    handled = 0
+
+    def get_request(self):
+        request, client_address = super().get_request()
+        # accepted sockets inherit O_NONBLOCK from the listener on BSD / macOS
+        request.setblocking(True)
+        return request, client_address
+
+    def process_request(self, request, client_address):
+        super().process_request(request, client_address)
+        self.handled += 1
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """
+    no per-request stderr line, used when the engine has an access log
+    """
+
+    def log_request(self, code="-", size="-"):
+        pass
+
+
+class Worker:
+    """
+    handle requests one at a time until stopped or recycled
+
+    SIGTERM and SIGINT stop the loop after the in-flight request,
+    outside the main thread no signal handlers are installed and
+    it serves until httpd.shutdown()
+    """
+
+    engine: "Engine"
+    httpd: "CountingServer"
+    max_requests: int
+    max_rss: int
+    alive: bool
+
+    def __init__(
+        self,
+        engine: "Engine",
+        httpd: "CountingServer",
+        poll_interval: float = 0.5,
+        max_requests=0,
+        max_requests_jitter=0,
+        max_rss=0,
+    ):
+        self.engine = engine
+        self.httpd = httpd
+        self.httpd.timeout = poll_interval
+        self.poll_interval = poll_interval
+        self.max_requests = max_requests
+        if max_requests and max_requests_jitter:
+            self.max_requests += random.randint(0, max_requests_jitter)
+        self.max_rss = max_rss
+        self.alive = True
+
+    def stop(self, *_):
+        self.alive = False
+
+    def run(self):
+        if threading.current_thread() is not threading.main_thread():
+            # signal handlers can only be installed in the main thread
+            self.engine.startup()
+            try:
+                self.httpd.serve_forever(poll_interval=self.poll_interval)
+            finally:
+                self.engine.shutdown()
+            return
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.engine.startup()
+        try:
+            rss_checked = time.monotonic()
+            while self.alive:
+                self.httpd.handle_request()
+                if self.max_requests and self.httpd.handled >= self.max_requests:
+                    break
+                if self.max_rss and time.monotonic() - rss_checked >= 1:
+                    rss_checked = time.monotonic()
+                    if current_rss() > self.max_rss:
+                        break
+        finally:
+            self.engine.shutdown()
+
+
+class Arbiter:
+    """
+    keep `workers` forked worker processes serving a shared socket
+
+    a worker exiting (recycled or crashed) is replaced,
+    workers failing within min_uptime are replaced with exponential backoff,
+    after max_failures such failures in a row the arbiter stops and raises,
+    SIGHUP starts a new set of workers before draining the old ones,
+    SIGTERM / SIGINT drain all workers, killing those still busy after drain_timeout
+    """
+
+    engine: "Engine"
+    httpd: "CountingServer"
+    workers: int
+    drain_timeout: float
+    children: Dict[int, float]
+    started: Dict[int, float]
+    min_uptime: float = 5
+    max_failures = 10
+
+    def __init__(
+        self,
+        engine: "Engine",
+        httpd: "CountingServer",
+        workers: int,
+        poll_interval: float = 0.5,
+        max_requests=0,
+        max_requests_jitter=0,
+        max_rss=0,
+        drain_timeout: float = 30,
+    ):
+        self.engine = engine
+        self.httpd = httpd
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_rss = max_rss
+        self.drain_timeout = drain_timeout
+        # pid -> drain deadline (0 while serving)
+        self.children = {}
+        # pid -> spawn time
+        self.started = {}
+        self.failures = 0
+        self.spawn_after = 0.0
+        self.stopping = False
+        self.reloading = False
+
+    def run(self):
+        if threading.current_thread() is not threading.main_thread():
+            raise ValueError("workers can only be managed from the main thread")
+        # workers race for connections, the loser must not block in accept
+        self.httpd.socket.setblocking(False)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+        try:
+            while not self.stopping:
+                self.reap()
+                if self.failures >= self.max_failures:
+                    break
+                if self.failures and self.healthy():
+                    self.failures = 0
+                if self.reloading:
+                    old = [pid for pid, deadline in self.children.items() if not deadline]
+                    # during startup backoff, keep the old workers until replacements exist
+                    if self.spawn_missing(serving=0):
+                        self.reloading = False
+                        self.drain(old)
+                self.spawn_missing()
+                self.kill_overdue()
+                time.sleep(self.poll_interval)
+
+            self.drain(list(self.children))
+            while self.children:
+                self.reap()
+                self.kill_overdue()
+                time.sleep(min(self.poll_interval, 0.1))
+        finally:
+            self.httpd.server_close()
+        if self.failures >= self.max_failures:
+            raise RuntimeError(
+                f"workers failed {self.failures} times within {self.min_uptime}s of starting"
+            )
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def reload(self, *_):
+        self.reloading = True
+
+    def spawn_missing(self, serving: Optional[int] = None) -> int:
+        """
+        fork workers up to `workers`, return how many were started
+        """
+        if time.monotonic() < self.spawn_after:
+            return 0
+        if serving is None:
+            serving = sum(1 for deadline in self.children.values() if not deadline)
+        missing = max(0, self.workers - serving)
+        for _ in range(missing):
+            self.spawn()
+        return missing
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = 0
+            self.started[pid] = time.monotonic()
+            return
+        code = 0
+        try:
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            Worker(
+                self.engine,
+                self.httpd,
+                poll_interval=self.poll_interval,
+                max_requests=self.max_requests,
+                max_requests_jitter=self.max_requests_jitter,
+                max_rss=self.max_rss,
+            ).run()
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+    def drain(self, pids):
+        deadline = time.monotonic() + self.drain_timeout
+        for pid in pids:
+            self.children[pid] = deadline
+            self.signal(pid, signal.SIGTERM)
+
+    def kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self.children.items()):
+            if deadline and now >= deadline:
+                self.signal(pid, signal.SIGKILL)
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if not pid:
+                return
+            deadline = self.children.pop(pid, None)
+            uptime = time.monotonic() - self.started.pop(pid, 0)
+            if deadline == 0 and status and uptime < self.min_uptime:
+                self.failures += 1
+                backoff = min(self.poll_interval * 2**self.failures, 10)
+                self.spawn_after = time.monotonic() + backoff
+
+    def healthy(self) -> bool:
+        """
+        whether a serving worker has outlived min_uptime
+        """
+        now = time.monotonic()
+        return any(
+            now - self.started[pid] >= self.min_uptime
+            for pid, deadline in self.children.items()
+            if not deadline
+        )
+
+    def signal(self, pid: int, sig: int):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def serve(
+    engine: "Engine",
+    addr: str,
+    port: int,
+    poll_interval: float = 0.5,
+    workers=0,
+    max_requests=0,
+    max_requests_jitter=0,
+    max_rss=0,
+    drain_timeout: float = 30,
+):
+    """
+    serve engine in this process (workers=0) or in forked worker processes
+    """
+    handler_class = WSGIRequestHandler
+    if engine.access_log is not None:
+        handler_class = QuietRequestHandler
+    httpd = make_server(
+        addr,
+        port,
+        engine.serve_http,
+        server_class=CountingServer,
+        handler_class=handler_class,
+    )
+    if not workers:
+        try:
+            Worker(engine, httpd, poll_interval=poll_interval).run()
+        finally:
+            httpd.server_close()
+        return
+    Arbiter(
+        engine,
+        httpd,
+        workers,
+        poll_interval=poll_interval,
+        max_requests=max_requests,
+        max_requests_jitter=max_requests_jitter,
+        max_rss=max_rss,
+        drain_timeout=drain_timeout,
+    ).run()
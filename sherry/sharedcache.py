@@ -0,0 +1,343 @@
+"""
+cache shared by pre-forked worker processes
+"""
+
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+from typing import Optional, Union
+
+Key = Union[str, bytes]
+
+# ref bit, key length, expiry timestamp (0 never), value length
+_SLOT = struct.Struct("<BxHdI")
+_HASH_MASK = (1 << 64) - 1
+# pid holding a stripe lock (0 none)
+_OWNER = struct.Struct("<q")
+
+
+class SharedCache:
+    """
+    fixed-size hash table in an anonymous shared mmap
+
+    each key hashes to a bucket of `ways` slots, a full bucket evicts
+    with CLOCK (second chance), each stripe lock guards every `stripes`-th bucket
+
+    keys are str or bytes, values are bytes, key + value must fit in
+    slot_size - 16 bytes (larger values are not stored);
+    create it before forking, the processes forked afterwards share it
+
+    a stripe lock not acquired within lock_timeout makes get miss and
+    set / delete do nothing; if its holder has died (e.g. a worker killed
+    at drain_timeout), the stripe is emptied and its lock released
+    """
+
+    capacity: int
+    slot_size: int
+    ways: int
+    default_ttl: float
+    lock_timeout: float
+
+    def __init__(
+        self,
+        capacity=4096,
+        slot_size=1024,
+        ways=8,
+        stripes=64,
+        default_ttl: float = 0,
+        lock_timeout: float = 0.05,
+    ):
+        """
+        :param capacity: number of entries (rounded up to a multiple of ways)
+        :param slot_size: bytes per entry, including a 16 byte header
+        :param ways: slots per bucket
+        :param stripes: number of locks
+        :param default_ttl: seconds an entry lives when set without ttl (0 forever)
+        :param lock_timeout: seconds to wait for a stripe lock
+        """
+        if slot_size <= _SLOT.size:
+            raise ValueError(f"slot_size must be larger than {_SLOT.size}")
+        if not 0 < ways < 256:
+            raise ValueError("ways must be between 1 and 255")
+        self.buckets = max(1, -(-capacity // ways))
+        self.capacity = self.buckets * ways
+        self.slot_size = slot_size
+        self.ways = ways
+        self.default_ttl = default_ttl
+        self.lock_timeout = lock_timeout
+        self._hashes = struct.Struct(f"<{ways}Q")
+        stripes = min(stripes, self.buckets)
+        # layout: hashes (0 = empty) | clock hands | slots | lock owners
+        self._hands_offset = self.capacity * 8
+        self._slots_offset = self._hands_offset + self.buckets
+        self._owners_offset = self._slots_offset + self.capacity * slot_size
+        self._buf = mmap.mmap(-1, self._owners_offset + stripes * _OWNER.size)
+        self._locks = [multiprocessing.Lock() for _ in range(stripes)]
+        self._recover_lock = multiprocessing.Lock()
+
+    def get(self, key: Key, default: Optional[bytes] = None) -> Optional[bytes]:
+        """
+        get value, default if missing or expired
+        """
+        k, h, bucket = self._locate(key)
+        buf = self._buf
+        stripe = self._acquire(bucket % len(self._locks))
+        if stripe < 0:
+            return default
+        try:
+            way, offset = self._find(buf, k, h, bucket)
+            if way < 0:
+                return default
+            ref, klen, expires, vlen = _SLOT.unpack_from(buf, offset)
+            if expires and expires < time.time():
+                self._clear_way(bucket, way)
+                return default
+            if not ref:
+                buf[offset] = 1
+            start = offset + _SLOT.size + klen
+            return buf[start : start + vlen]
+        finally:
+            self._release(stripe)
+
+    def set(self, key: Key, value: bytes, ttl: Optional[float] = None) -> bool:
+        """
+        set value, live for ttl seconds (default_ttl if None, 0 forever)
+
+        :return: False if key + value do not fit in a slot or the lock timed out
+        """
+        k, h, bucket = self._locate(key)
+        if _SLOT.size + len(k) + len(value) > self.slot_size:
+            self.delete(key)
+            return False
+        if ttl is None:
+            ttl = self.default_ttl
+        now = time.time()
+        buf = self._buf
+        stripe = self._acquire(bucket % len(self._locks))
+        if stripe < 0:
+            return False
+        try:
+            way, offset = self._find(buf, k, h, bucket)
+            if way < 0:
+                way = self._victim(buf, bucket, now)
+                offset = self._slot_offset(bucket, way)
+                # hide the slot while it is rewritten
+                self._clear_way(bucket, way)
+            _SLOT.pack_into(buf, offset, 0, len(k), now + ttl if ttl else 0, len(value))
+            start = offset + _SLOT.size
+            buf[start : start + len(k)] = k
+            buf[start + len(k) : start + len(k) + len(value)] = value
+            struct.pack_into("<Q", buf, (bucket * self.ways + way) * 8, h)
+        finally:
+            self._release(stripe)
+        return True
+
+    def delete(self, key: Key) -> bool:
+        """
+        remove key, return whether it existed
+        """
+        k, h, bucket = self._locate(key)
+        stripe = self._acquire(bucket % len(self._locks))
+        if stripe < 0:
+            return False
+        try:
+            way, _ = self._find(self._buf, k, h, bucket)
+            if way < 0:
+                return False
+            self._clear_way(bucket, way)
+            return True
+        finally:
+            self._release(stripe)
+
+    def clear(self):
+        """
+        remove all entries, also from stripes whose lock timed out
+        """
+        acquired = [s for s in range(len(self._locks)) if self._acquire(s) >= 0]
+        try:
+            self._buf[: self._hands_offset] = bytes(self._hands_offset)
+        finally:
+            for stripe in acquired:
+                self._release(stripe)
+
+    def close(self):
+        self._buf.close()
+
+    def __getitem__(self, key: Key) -> bytes:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Key, value: bytes):
+        self.set(key, value)
+
+    def __delitem__(self, key: Key):
+        if not self.delete(key):
+            raise KeyError(key)
+
+    def __contains__(self, key: Key) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        """
+        number of occupied slots, expired entries included until touched
+        """
+        hashes = struct.unpack_from(f"<{self.capacity}Q", self._buf, 0)
+        return self.capacity - hashes.count(0)
+
+    def _acquire(self, stripe: int) -> int:
+        """
+        lock a stripe, return it, or -1 on timeout
+        """
+        lock = self._locks[stripe]
+        # uncontended fast path, a timed wait is much slower
+        if lock.acquire(False) or lock.acquire(timeout=self.lock_timeout):
+            _OWNER.pack_into(self._buf, self._owner_offset(stripe), os.getpid())
+            return stripe
+        if self._recover(stripe) and lock.acquire(timeout=self.lock_timeout):
+            _OWNER.pack_into(self._buf, self._owner_offset(stripe), os.getpid())
+            return stripe
+        return -1
+
+    def _release(self, stripe: int):
+        # clear the owner first, a stale owner could look dead while the lock is held
+        _OWNER.pack_into(self._buf, self._owner_offset(stripe), 0)
+        self._locks[stripe].release()
+
+    def _owner_offset(self, stripe: int) -> int:
+        return self._owners_offset + stripe * _OWNER.size
+
+    def _recover(self, stripe: int) -> bool:
+        """
+        release a stripe whose holder died, emptying its buckets
+        (the holder may have left a slot half written)
+        """
+        offset = self._owner_offset(stripe)
+        owner = _OWNER.unpack_from(self._buf, offset)[0]
+        if not owner or _alive(owner):
+            return False
+        if not self._recover_lock.acquire(timeout=self.lock_timeout):
+            return False
+        try:
+            # another process may have recovered it already
+            if _OWNER.unpack_from(self._buf, offset)[0] != owner:
+                return False
+            empty = bytes(self.ways * 8)
+            for bucket in range(stripe, self.buckets, len(self._locks)):
+                start = bucket * self.ways * 8
+                self._buf[start : start + len(empty)] = empty
+            _OWNER.pack_into(self._buf, offset, 0)
+            try:
+                self._locks[stripe].release()
+            except ValueError:
+                # not held anymore
+                pass
+            return True
+        finally:
+            self._recover_lock.release()
+
+    def _locate(self, key: Key):
+        k = key.encode() if isinstance(key, str) else key
+        # hash() is shared by forked processes, 0 marks an empty slot
+        h = (hash(k) & _HASH_MASK) or 1
+        return k, h, h % self.buckets
+
+    def _slot_offset(self, bucket: int, way: int) -> int:
+        return self._slots_offset + (bucket * self.ways + way) * self.slot_size
+
+    def _find(self, buf, k: bytes, h: int, bucket: int):
+        hashes = self._hashes.unpack_from(buf, bucket * self.ways * 8)
+        if h not in hashes:
+            return -1, 0
+        for way, value in enumerate(hashes):
+            if value == h:
+                offset = self._slot_offset(bucket, way)
+                start = offset + _SLOT.size
+                if buf[offset + 2 : offset + 4] == struct.pack("<H", len(k)) and (
+                    buf[start : start + len(k)] == k
+                ):
+                    return way, offset
+        return -1, 0
+
+    def _clear_way(self, bucket: int, way: int):
+        struct.pack_into("<Q", self._buf, (bucket * self.ways + way) * 8, 0)
+
+    def _victim(self, buf, bucket: int, now: float) -> int:
+        hashes = self._hashes.unpack_from(buf, bucket * self.ways * 8)
+        if 0 in hashes:
+            return hashes.index(0)
+        for way in range(self.ways):
+            _, _, expires, _ = _SLOT.unpack_from(buf, self._slot_offset(bucket, way))
+            if expires and expires < now:
+                return way
+        # clock: skip (and clear) referenced slots once
+        hand_offset = self._hands_offset + bucket
+        hand = buf[hand_offset]
+        while True:
+            offset = self._slot_offset(bucket, hand)
+            if buf[offset]:
+                buf[offset] = 0
+                hand = (hand + 1) % self.ways
+            else:
+                buf[hand_offset] = (hand + 1) % self.ways
+                return hand
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def benchmark(n=100000, workers=4):
+    """
+    compare SharedCache with a per-process dict
+    """
+    import os
+
+    keys = [f"key:{i}" for i in range(1024)]
+    value = b"x" * 256
+
+    def measure(name, get, put):
+        begin = time.perf_counter()
+        for i in range(n):
+            put(keys[i % len(keys)], value)
+        middle = time.perf_counter()
+        for i in range(n):
+            get(keys[i % len(keys)])
+        end = time.perf_counter()
+        print(
+            f"{name:>12}  set {n / (middle - begin):>10.0f}/s"
+            f"  get {n / (end - middle):>10.0f}/s"
+        )
+
+    local = {}
+    measure("dict", local.get, local.__setitem__)
+    cache = SharedCache(capacity=2048, slot_size=512)
+    measure("SharedCache", cache.get, cache.set)
+
+    # entries written by one process are hits in the others
+    cache.clear()
+    for key in keys:
+        cache.set(key, value)
+    expected = sum(cache.get(key) == value for key in keys)
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if not pid:
+            hits = sum(cache.get(key) == value for key in keys)
+            os._exit(0 if hits == expected else 1)
+        pids.append(pid)
+    shared = all(os.waitpid(pid, 0)[1] == 0 for pid in pids)
+    print(f"{workers} forked processes see the parent's entries: {shared}")
+
+
+if __name__ == "__main__":
+    benchmark()